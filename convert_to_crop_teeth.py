@@ -2,97 +2,254 @@
 """
 Script to crop individual teeth from dental images based on bounding boxes.
 Creates a new dataset with square padded, 448x448 cropped images.
+Crops are grouped by source image and processed across all CPU cores.
 """
 
 import json
 import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 from pathlib import Path
 
+# orjson encodes/decodes several times faster than stdlib json when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-def crop_and_resize(image_path, bbox, output_path, target_size=448, expand_ratio=0.2):
+# pyvips uses libvips' SIMD-accelerated resampler; fall back to PIL if absent
+# (installing pillow-simd gives a drop-in speedup on the PIL path too)
+try:
+    import pyvips
+except ImportError:
+    pyvips = None
+
+# With a CUDA GPU, all of an image's crops can be resized in one batched
+# roi_align call instead of per-crop CPU Lanczos
+try:
+    import torch
+    import torchvision
+    from torchvision.ops import roi_align
+except ImportError:
+    torch = None
+
+
+def dumps_line(obj):
+    """Serialize one JSONL record to bytes, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj) + b'\n'
+    return (json.dumps(obj) + '\n').encode('utf-8')
+
+
+def crop_and_resize_from_img(img, bbox, output_path, target_size=448, expand_ratio=0.2):
     """
-    Crop an image using the bounding box coordinates, pad to square with black,
-    and resize to target size.
-    
+    Crop an already-open image using the bounding box coordinates, pad to
+    square with black, and resize to target size.
+
     Args:
-        image_path: Path to the source image
+        img: An open PIL.Image for the source image
         bbox: List of [x1, y1, x2, y2] coordinates
         output_path: Path to save the cropped image
         target_size: Target size for the square output (default 448)
         expand_ratio: Ratio to expand the bounding box (default 0.2 = 20%)
     """
+    x1, y1, x2, y2 = bbox
+
+    # Expand bounding box by 20% in each direction
+    width, height = img.size
+    bbox_width = x2 - x1
+    bbox_height = y2 - y1
+
+    # Calculate expansion
+    x1 = int(x1 - expand_ratio * bbox_width)
+    x2 = int(x2 + expand_ratio * bbox_width)
+    y1 = int(y1 - expand_ratio * bbox_height)
+    y2 = int(y2 + expand_ratio * bbox_height)
+
+    # Ensure coordinates are within image bounds
+    x1 = max(0, min(x1, width))
+    y1 = max(0, min(y1, height))
+    x2 = max(0, min(x2, width))
+    y2 = max(0, min(y2, height))
+
+    # Crop the image
+    cropped = img.crop((x1, y1, x2, y2))
+
+    # Resize the crop directly to its final scale, then center it on a black
+    # target-size canvas. Equivalent to pad-to-square + resize, but Lanczos
+    # only resamples real pixels instead of a full max_dim x max_dim square.
+    crop_width, crop_height = cropped.size
+    max_dim = max(crop_width, crop_height)
+    scale = target_size / max_dim
+    new_w = round(crop_width * scale)
+    new_h = round(crop_height * scale)
+    small = cropped.resize((new_w, new_h), Image.Resampling.LANCZOS)
+
+    canvas = Image.new('RGB', (target_size, target_size), (0, 0, 0))
+    canvas.paste(small, ((target_size - new_w) // 2, (target_size - new_h) // 2))
+
+    # Save via libjpeg-turbo's fast path: skip the second-pass Huffman
+    # optimization and progressive scan, and use 4:2:0 chroma subsampling
+    canvas.save(output_path, 'JPEG', quality=95, optimize=False,
+                progressive=False, subsampling='4:2:0')
+
+
+def crop_and_resize(image_path, bbox, output_path, target_size=448, expand_ratio=0.2):
+    """
+    Crop an image file using the bounding box coordinates, pad to square with
+    black, and resize to target size.
+    """
     with Image.open(image_path) as img:
-        x1, y1, x2, y2 = bbox
-        
-        # Expand bounding box by 20% in each direction
-        width, height = img.size
-        bbox_width = x2 - x1
-        bbox_height = y2 - y1
-        
-        # Calculate expansion
-        x1 = int(x1 - expand_ratio * bbox_width)
-        x2 = int(x2 + expand_ratio * bbox_width)
-        y1 = int(y1 - expand_ratio * bbox_height)
-        y2 = int(y2 + expand_ratio * bbox_height)
-        
-        # Ensure coordinates are within image bounds
-        x1 = max(0, min(x1, width))
-        y1 = max(0, min(y1, height))
-        x2 = max(0, min(x2, width))
-        y2 = max(0, min(y2, height))
-        
-        # Crop the image
-        cropped = img.crop((x1, y1, x2, y2))
-        
-        # Calculate dimensions for square padding
-        crop_width, crop_height = cropped.size
-        max_dim = max(crop_width, crop_height)
-        
-        # Create a new black square image
-        square_img = Image.new('RGB', (max_dim, max_dim), (0, 0, 0))
-        
-        # Calculate position to center the crop
-        paste_x = (max_dim - crop_width) // 2
-        paste_y = (max_dim - crop_height) // 2
-        
-        # Paste the cropped image onto the black square
-        square_img.paste(cropped, (paste_x, paste_y))
-        
-        # Resize to target size
-        resized = square_img.resize((target_size, target_size), Image.Resampling.LANCZOS)
-        
-        # Save
-        resized.save(output_path, quality=95)
+        crop_and_resize_from_img(img, bbox, output_path, target_size, expand_ratio)
+
+
+def crop_and_resize_vips(vimg, bbox, output_path, target_size=448, expand_ratio=0.2):
+    """
+    Same crop/pad/resize as crop_and_resize_from_img but through libvips,
+    whose lanczos3 resampler is SIMD-vectorized.
+    """
+    x1, y1, x2, y2 = bbox
+
+    width, height = vimg.width, vimg.height
+    bbox_width = x2 - x1
+    bbox_height = y2 - y1
+
+    x1 = int(x1 - expand_ratio * bbox_width)
+    x2 = int(x2 + expand_ratio * bbox_width)
+    y1 = int(y1 - expand_ratio * bbox_height)
+    y2 = int(y2 + expand_ratio * bbox_height)
+
+    x1 = max(0, min(x1, width))
+    y1 = max(0, min(y1, height))
+    x2 = max(0, min(x2, width))
+    y2 = max(0, min(y2, height))
+
+    cropped = vimg.crop(x1, y1, x2 - x1, y2 - y1)
+
+    # Embed onto a centered black square, then resize to target
+    max_dim = max(cropped.width, cropped.height)
+    paste_x = (max_dim - cropped.width) // 2
+    paste_y = (max_dim - cropped.height) // 2
+    padded = cropped.embed(paste_x, paste_y, max_dim, max_dim, background=[0])
+
+    resized = padded.resize(target_size / max_dim, kernel='lanczos3')
+    resized.jpegsave(output_path, Q=95, subsample_mode='on')
+
+
+def _expanded_square_box(bbox, width, height, expand_ratio=0.2):
+    """
+    Expand and clamp a bbox like crop_and_resize_from_img, then grow the
+    short side to a centered square. Parts of the square that fall outside
+    the image become black padding when sampled with roi_align.
+    """
+    x1, y1, x2, y2 = bbox
+
+    bbox_width = x2 - x1
+    bbox_height = y2 - y1
+
+    x1 = int(x1 - expand_ratio * bbox_width)
+    x2 = int(x2 + expand_ratio * bbox_width)
+    y1 = int(y1 - expand_ratio * bbox_height)
+    y2 = int(y2 + expand_ratio * bbox_height)
+
+    x1 = max(0, min(x1, width))
+    y1 = max(0, min(y1, height))
+    x2 = max(0, min(x2, width))
+    y2 = max(0, min(y2, height))
+
+    max_dim = max(x2 - x1, y2 - y1)
+    cx = (x1 + x2) / 2
+    cy = (y1 + y2) / 2
+    half = max_dim / 2
+    return (cx - half, cy - half, cx + half, cy + half)
+
+
+def _process_image_group_gpu(group, target_size=448):
+    """
+    Crop, square-pad, and resize every bbox of one image in a single batched
+    roi_align call on the GPU, then JPEG-encode the results.
+    """
+    input_image_path, jobs = group
+    records = []
+    with Image.open(input_image_path) as img:
+        rgb = img.convert('RGB')
+        width, height = rgb.size
+        img_t = torchvision.transforms.functional.pil_to_tensor(rgb)
+        img_t = img_t.float().unsqueeze(0).to('cuda', non_blocking=True)
+
+        boxes = torch.tensor(
+            [_expanded_square_box(bbox, width, height) for bbox, _, _ in jobs],
+            dtype=torch.float32, device='cuda'
+        )
+        crops = roi_align(img_t, [boxes], output_size=(target_size, target_size),
+                          aligned=True)
+        crops = crops.round().clamp(0, 255).to(torch.uint8).cpu()
+
+    for crop, (bbox, output_image_path, output_data) in zip(crops, jobs):
+        encoded = torchvision.io.encode_jpeg(crop, quality=95)
+        with open(output_image_path, 'wb') as f:
+            f.write(encoded.numpy().tobytes())
+        records.append(output_data)
+    return records
+
+
+def _process_image_group(group):
+    """
+    Worker: open one source image and produce all of its crops.
+    Returns the metadata records for the crops that were written.
+    """
+    input_image_path, jobs = group
+    records = []
+    if pyvips is not None:
+        # Sequential access streams JPEG rows instead of decoding the whole
+        # image up front; it only allows one top-to-bottom pass, so fall back
+        # to random access when several crops are taken from the same image
+        access = 'sequential' if len(jobs) == 1 else 'random'
+        vimg = pyvips.Image.new_from_file(input_image_path, access=access)
+        if vimg.bands == 1:
+            vimg = vimg.colourspace('srgb')
+        for bbox, output_image_path, output_data in jobs:
+            crop_and_resize_vips(vimg, bbox, output_image_path)
+            records.append(output_data)
+    else:
+        with Image.open(input_image_path) as img:
+            img.load()
+            for bbox, output_image_path, output_data in jobs:
+                crop_and_resize_from_img(img, bbox, output_image_path)
+                records.append(output_data)
+    return records
 
 
 def process_dataset(input_jsonl, output_dir, dataset_dir):
     os.makedirs(output_dir, exist_ok=True)
-    
+
     output_jsonl = os.path.join(output_dir, 'dataset.jsonl')
-    
+
+    # One directory scan up front replaces a stat() call per dataset row
+    existing_images = {e.name for e in os.scandir(dataset_dir) if e.is_file()}
+
+    # Group crop jobs by source image so each worker decodes an image once
+    groups = defaultdict(list)
     line_num = 0
-    with open(input_jsonl, 'r') as infile, open(output_jsonl, 'w') as outfile:
+    with open(input_jsonl, 'r') as infile:
         for line_num, line in enumerate(infile, 1):
-            data = json.loads(line.strip())
-            
+            data = orjson.loads(line) if orjson is not None else json.loads(line.strip())
+
             # Extract fields
             image_name = data['image']
             tooth = data['tooth']
             diagnosis = data['diagnosis']
             treatment = data['treatment']
             bbox = data['bbox']
-            
+
             # Create unique filename for cropped image
             base_name = Path(image_name).stem
             crop_filename = f"{base_name}_tooth_{line_num:05d}.jpg"
             output_image_path = os.path.join(output_dir, crop_filename)
-            
-            # Crop the image
+
             input_image_path = os.path.join(dataset_dir, image_name)
-            if os.path.exists(input_image_path):
-                crop_and_resize(input_image_path, bbox, output_image_path)
-                
+            if image_name in existing_images:
                 # Create output metadata with same keys
                 output_data = {
                     'tooth': tooth,
@@ -100,16 +257,42 @@ def process_dataset(input_jsonl, output_dir, dataset_dir):
                     'diagnosis': diagnosis,
                     'filename': crop_filename
                 }
-                
-                # Write to output jsonl
-                outfile.write(json.dumps(output_data) + '\n')
-                
-                if line_num % 100 == 0:
-                    print(f"Processed {line_num} images...")
+                groups[input_image_path].append((bbox, output_image_path, output_data))
             else:
                 print(f"Warning: Image not found: {input_image_path}")
-    
-    print(f"\nComplete! Processed {line_num} entries.")
+
+    # Crop one source image per job; write JSONL from the main process as
+    # results come back so workers never contend on the file
+    processed = 0
+    buf = []
+    with open(output_jsonl, 'wb') as outfile:
+
+        def write_records(records):
+            nonlocal processed
+            for output_data in records:
+                # Batch writes so the writer lock is taken once per block
+                buf.append(dumps_line(output_data))
+                processed += 1
+                if processed % 100 == 0:
+                    print(f"Processed {processed} images...")
+            if len(buf) >= 4096:
+                outfile.write(b''.join(buf))
+                buf.clear()
+
+        if torch is not None and torch.cuda.is_available():
+            # GPU path: batched roi_align per image, run in-process since
+            # CUDA contexts don't survive fork
+            for records in map(_process_image_group_gpu, groups.items()):
+                write_records(records)
+        else:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                for records in executor.map(_process_image_group, groups.items(), chunksize=8):
+                    write_records(records)
+
+        if buf:
+            outfile.write(b''.join(buf))
+
+    print(f"\nComplete! Processed {processed} of {line_num} entries.")
     print(f"Cropped images saved to: {output_dir}")
     print(f"Metadata saved to: {output_jsonl}")
 
@@ -119,5 +302,5 @@ if __name__ == '__main__':
     INPUT_JSONL = 'dataset_all/dataset.jsonl'
     OUTPUT_DIR = 'dataset_no_diagnosis'
     DATASET_DIR = 'dataset_all'
-    
+
     process_dataset(INPUT_JSONL, OUTPUT_DIR, DATASET_DIR)
@@ -7,6 +7,24 @@ Each record teeth bounding contains all boxes in one image.
 import json
 import os
 
+# Stream the dataset array instead of materializing the full DOM in RAM
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# orjson encodes/decodes several times faster than stdlib json when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# NumPy lets the bbox token formatting run in vectorized C loops
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 INPUT_JSON = "dataset_all/dataset.json"
 OUTPUT_JSONL = "dataset_all/tooth_problem_dataset.jsonl"
 
@@ -16,35 +34,78 @@ def convert_box_to_paligemma_tokens(y1, x1, y2, x2):
     return f"<loc{y1:04d}><loc{x1:04d}><loc{y2:04d}><loc{x2:04d}>"
 
 
+# Below this many boxes the scalar f-string path beats NumPy's setup cost
+_VECTORIZE_MIN_BOXES = 32
+
+
+def convert_boxes_to_paligemma_tokens(coords):
+    """Convert a batch of (y1, x1, y2, x2) boxes to PaliGemma token strings.
+
+    Uses vectorized NumPy char ops when the batch is large enough to amortize
+    the array setup, otherwise per-box f-strings.
+    """
+    if np is not None and len(coords) >= _VECTORIZE_MIN_BOXES:
+        arr = np.asarray(coords, dtype=np.int32)
+        parts = np.char.zfill(arr.astype('U4'), 4)
+        tokens = np.char.add('<loc', parts[:, 0])
+        for col in (1, 2, 3):
+            tokens = np.char.add(np.char.add(tokens, '><loc'), parts[:, col])
+        return list(np.char.add(tokens, '>'))
+    return [
+        f"<loc{y1:04d}><loc{x1:04d}><loc{y2:04d}><loc{x2:04d}>"
+        for y1, x1, y2, x2 in coords
+    ]
+
+
+def dumps_line(obj):
+    """Serialize one JSONL record to bytes, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj) + b'\n'
+    return (json.dumps(obj) + '\n').encode('utf-8')
+
+
+def iter_dataset_items(f):
+    """Yield dataset entries one at a time, streaming with ijson if available."""
+    if ijson is not None:
+        yield from ijson.items(f, 'item')
+    elif orjson is not None:
+        yield from orjson.loads(f.read())
+    else:
+        yield from json.load(f)
+
+
 def process_dataset():
     """Process dataset and create JSONL with tooth/problem tooth labels."""
-    with open(INPUT_JSON, 'r') as f:
-        data = json.load(f)
-    
     prompt = "detect tooth; detect problem tooth;"
-    
-    with open(OUTPUT_JSONL, 'w') as f_out:
-        for item in data:
+
+    num_samples = 0
+    problem_count = 0
+    healthy_count = 0
+    buf = []
+
+    with open(INPUT_JSON, 'rb') as f, open(OUTPUT_JSONL, 'wb') as f_out:
+        for item in iter_dataset_items(f):
             objects = item['objects']
-            
+
+            # Tokenize all boxes for this image in one (possibly vectorized) pass
+            box_tokens = convert_boxes_to_paligemma_tokens(
+                [(o['y1'], o['x1'], o['y2'], o['x2']) for o in objects]
+            )
+
             target_parts = []
-            
-            for obj in objects:
-                # Get bbox coords
-                y1, x1, y2, x2 = obj['y1'], obj['x1'], obj['y2'], obj['x2']
-                
-                # Convert to PaliGemma token format
-                box_tokens = convert_box_to_paligemma_tokens(y1, x1, y2, x2)
-                
-                # Determine label based on treatment
+
+            for obj, tokens in zip(objects, box_tokens):
+                # Determine label based on treatment, tallying stats as we go
                 treatment = obj.get('treatment', 'none')
                 if treatment == 'none':
                     label = 'tooth'
+                    healthy_count += 1
                 else:
                     label = 'problem tooth'
-                
-                target_parts.append(f"{box_tokens} {label}")
-            
+                    problem_count += 1
+
+                target_parts.append(f"{tokens} {label}")
+
             # Create sample
             sample = {
                 "image": item['file'],
@@ -52,21 +113,18 @@ def process_dataset():
                 "target": "; ".join(target_parts),
                 "num_objects": len(objects)
             }
-            
-            f_out.write(json.dumps(sample) + '\n')
-    
-    print(f"Created {OUTPUT_JSONL} with {len(data)} samples")
-    
-    # Print some stats
-    problem_count = 0
-    healthy_count = 0
-    for item in data:
-        for obj in item['objects']:
-            if obj.get('treatment') == 'none':
-                healthy_count += 1
-            else:
-                problem_count += 1
-    
+
+            # Batch writes so the buffered-writer lock is taken once per block
+            buf.append(dumps_line(sample))
+            num_samples += 1
+            if len(buf) >= 4096:
+                f_out.write(b''.join(buf))
+                buf.clear()
+
+        if buf:
+            f_out.write(b''.join(buf))
+
+    print(f"Created {OUTPUT_JSONL} with {num_samples} samples")
     print(f"Total healthy teeth: {healthy_count}")
     print(f"Total problem teeth: {problem_count}")
 
@@ -13,86 +13,159 @@ from PIL import Image
 from pathlib import Path
 from collections import defaultdict
 
+# pyvips uses libvips' SIMD-accelerated resampler; fall back to PIL if absent
+# (installing pillow-simd gives a drop-in speedup on the PIL path too)
+try:
+    import pyvips
+except ImportError:
+    pyvips = None
+
+# Stream the dataset array instead of materializing the full DOM in RAM
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# orjson encodes/decodes several times faster than stdlib json when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# zstd squeezes the highly repetitive JSONL ~5-10x at several hundred MB/s;
+# HuggingFace datasets reads .jsonl.zst natively
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
 random.seed(42)
 
-def crop_and_resize(image_path, bbox, output_path, target_size=448, expand_ratio=1.2):
+def crop_and_resize_from_img(img, bbox, output_path, target_size=448, expand_ratio=1.2):
     """
-    Crop an image using the bounding box coordinates, pad to square with black,
-    and resize to target size.
+    Crop an already-open image using the bounding box coordinates, pad to
+    square with black, and resize to target size.
     """
-    with Image.open(image_path) as img:
-        x1, y1, x2, y2 = bbox
-        
-        # Expand bounding box by expand_ratio in each direction (1.2 = 20%)
-        width, height = img.size
-        bbox_width = x2 - x1
-        bbox_height = y2 - y1
-        
-        # Calculate expansion
-        x1 = int(x1 - (expand_ratio - 1) * bbox_width / 2)
-        x2 = int(x2 + (expand_ratio - 1) * bbox_width / 2)
-        y1 = int(y1 - (expand_ratio - 1) * bbox_height / 2)
-        y2 = int(y2 + (expand_ratio - 1) * bbox_height / 2)
-        
-        # Ensure coordinates are within image bounds
-        x1 = max(0, min(x1, width))
-        y1 = max(0, min(y1, height))
-        x2 = max(0, min(x2, width))
-        y2 = max(0, min(y2, height))
-        
-        # Crop the image
-        cropped = img.crop((x1, y1, x2, y2))
-        
-        # Calculate dimensions for square padding
-        crop_width, crop_height = cropped.size
-        max_dim = max(crop_width, crop_height)
-        
-        # Create a new black square image
-        square_img = Image.new('RGB', (max_dim, max_dim), (0, 0, 0))
-        
-        # Calculate position to center the crop
-        paste_x = (max_dim - crop_width) // 2
-        paste_y = (max_dim - crop_height) // 2
-        
-        # Paste the cropped image onto the black square
-        square_img.paste(cropped, (paste_x, paste_y))
-        
-        # Resize to target size
-        resized = square_img.resize((target_size, target_size), Image.Resampling.LANCZOS)
-        
-        # Save
-        resized.save(output_path, quality=95)
+    x1, y1, x2, y2 = bbox
+    
+    # Expand bounding box by expand_ratio in each direction (1.2 = 20%)
+    width, height = img.size
+    bbox_width = x2 - x1
+    bbox_height = y2 - y1
+    
+    # Calculate expansion
+    x1 = int(x1 - (expand_ratio - 1) * bbox_width / 2)
+    x2 = int(x2 + (expand_ratio - 1) * bbox_width / 2)
+    y1 = int(y1 - (expand_ratio - 1) * bbox_height / 2)
+    y2 = int(y2 + (expand_ratio - 1) * bbox_height / 2)
+    
+    # Ensure coordinates are within image bounds
+    x1 = max(0, min(x1, width))
+    y1 = max(0, min(y1, height))
+    x2 = max(0, min(x2, width))
+    y2 = max(0, min(y2, height))
+    
+    # Crop the image
+    cropped = img.crop((x1, y1, x2, y2))
+
+    # Resize the crop directly to its final scale, then center it on a black
+    # target-size canvas. Equivalent to pad-to-square + resize, but Lanczos
+    # only resamples real pixels instead of a full max_dim x max_dim square.
+    crop_width, crop_height = cropped.size
+    max_dim = max(crop_width, crop_height)
+    scale = target_size / max_dim
+    new_w = round(crop_width * scale)
+    new_h = round(crop_height * scale)
+    small = cropped.resize((new_w, new_h), Image.Resampling.LANCZOS)
+
+    canvas = Image.new('RGB', (target_size, target_size), (0, 0, 0))
+    canvas.paste(small, ((target_size - new_w) // 2, (target_size - new_h) // 2))
+
+    # Save via libjpeg-turbo's fast path: skip the second-pass Huffman
+    # optimization and progressive scan, and use 4:2:0 chroma subsampling
+    canvas.save(output_path, 'JPEG', quality=95, optimize=False,
+                progressive=False, subsampling='4:2:0')
+
+def crop_and_resize_vips(vimg, bbox, output_path, target_size=448, expand_ratio=1.2):
+    """
+    Same crop/pad/resize as crop_and_resize_from_img but through libvips,
+    whose lanczos3 resampler is SIMD-vectorized.
+    """
+    x1, y1, x2, y2 = bbox
+
+    width, height = vimg.width, vimg.height
+    bbox_width = x2 - x1
+    bbox_height = y2 - y1
+
+    x1 = int(x1 - (expand_ratio - 1) * bbox_width / 2)
+    x2 = int(x2 + (expand_ratio - 1) * bbox_width / 2)
+    y1 = int(y1 - (expand_ratio - 1) * bbox_height / 2)
+    y2 = int(y2 + (expand_ratio - 1) * bbox_height / 2)
+
+    x1 = max(0, min(x1, width))
+    y1 = max(0, min(y1, height))
+    x2 = max(0, min(x2, width))
+    y2 = max(0, min(y2, height))
+
+    cropped = vimg.crop(x1, y1, x2 - x1, y2 - y1)
+
+    # Embed onto a centered black square, then resize to target
+    max_dim = max(cropped.width, cropped.height)
+    paste_x = (max_dim - cropped.width) // 2
+    paste_y = (max_dim - cropped.height) // 2
+    padded = cropped.embed(paste_x, paste_y, max_dim, max_dim, background=[0])
+
+    resized = padded.resize(target_size / max_dim, kernel='lanczos3')
+    resized.jpegsave(output_path, Q=95, subsample_mode='on')
+
+def dumps_line(obj):
+    """Serialize one JSONL record to bytes, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj) + b'\n'
+    return (json.dumps(obj) + '\n').encode('utf-8')
+
+
+def iter_dataset_items(f):
+    """Yield dataset entries one at a time, streaming with ijson if available."""
+    if ijson is not None:
+        yield from ijson.items(f, 'item')
+    elif orjson is not None:
+        yield from orjson.loads(f.read())
+    else:
+        yield from json.load(f)
 
 def main():
     # Load dataset
     print("Loading dataset...")
-    with open('dataset_all/dataset.json') as f:
-        data = json.load(f)
-    
-    print(f"Total images: {len(data)}")
-    
-    # Group objects by treatment
+
+    # Group objects by treatment, streaming the JSON entry by entry
     treatment_groups = defaultdict(list)
-    
-    for item in data:
-        image_name = item['file']
-        image_path = os.path.join('dataset_all', image_name)
-        
-        for obj in item.get('objects', []):
-            treatment = obj['treatment']
-            bbox = [obj['x1'], obj['y1'], obj['x2'], obj['y2']]
-            tooth = obj['tooth']
-            diagnosis = obj['diagnosis']
-            
-            treatment_groups[treatment].append({
-                'image_path': image_path,
-                'image_name': image_name,
-                'bbox': bbox,
-                'tooth': tooth,
-                'treatment': treatment,
-                'diagnosis': diagnosis
-            })
-    
+    num_images = 0
+
+    with open('dataset_all/dataset.json', 'rb') as f:
+        for item in iter_dataset_items(f):
+            num_images += 1
+            image_name = item['file']
+            image_path = os.path.join('dataset_all', image_name)
+
+            for obj in item.get('objects', []):
+                treatment = obj['treatment']
+                bbox = [obj['x1'], obj['y1'], obj['x2'], obj['y2']]
+                tooth = obj['tooth']
+                diagnosis = obj['diagnosis']
+
+                treatment_groups[treatment].append({
+                    'image_path': image_path,
+                    'image_name': image_name,
+                    'bbox': bbox,
+                    'tooth': tooth,
+                    'treatment': treatment,
+                    'diagnosis': diagnosis
+                })
+
+    print(f"Total images: {num_images}")
+
+
     # Print original distribution
     print("\nOriginal treatment distribution:")
     for t, items in sorted(treatment_groups.items()):
@@ -124,34 +197,69 @@ def main():
     
     print(f"\nProcessing {len(all_samples)} samples...")
     
-    output_records = []
-    
+    # Group crop jobs by source image so each image is decoded only once;
+    # each job keeps its shuffled index so the output JSONL stays in
+    # shuffled order rather than image-grouped order
+    output_records = [None] * len(all_samples)
+    crop_jobs = defaultdict(list)
     for idx, sample in enumerate(all_samples):
         # Create unique filename
         image_stem = Path(sample['image_name']).stem
         filename = f"{image_stem}_tooth_{idx:05d}.jpg"
         output_path = os.path.join(output_dir, filename)
-        
-        # Crop and resize
-        crop_and_resize(sample['image_path'], sample['bbox'], output_path)
-        
-        # Create record
-        record = {
-            'image': filename,
-            'tooth': sample['tooth'],
-            'treatment': sample['treatment'],
-            'diagnosis': sample['diagnosis']
-        }
-        output_records.append(record)
-        
-        if (idx + 1) % 500 == 0:
-            print(f"Processed {idx + 1}/{len(all_samples)}...")
-    
-    # Save jsonl
+        crop_jobs[sample['image_path']].append((idx, sample, filename, output_path))
+
+    processed = 0
+    for image_path, jobs in crop_jobs.items():
+        if pyvips is not None:
+            # Sequential access streams JPEG rows instead of decoding the
+            # whole image up front; it only allows one top-to-bottom pass, so
+            # fall back to random access when taking several crops per image
+            access = 'sequential' if len(jobs) == 1 else 'random'
+            vimg = pyvips.Image.new_from_file(image_path, access=access)
+            if vimg.bands == 1:
+                vimg = vimg.colourspace('srgb')
+        else:
+            vimg = None
+            img = Image.open(image_path)
+            img.load()
+
+        for idx, sample, filename, output_path in jobs:
+            # Crop and resize
+            if vimg is not None:
+                crop_and_resize_vips(vimg, sample['bbox'], output_path)
+            else:
+                crop_and_resize_from_img(img, sample['bbox'], output_path)
+
+            # Create record
+            record = {
+                'image': filename,
+                'tooth': sample['tooth'],
+                'treatment': sample['treatment'],
+                'diagnosis': sample['diagnosis']
+            }
+            output_records[idx] = record
+
+            processed += 1
+            if processed % 500 == 0:
+                print(f"Processed {processed}/{len(all_samples)}...")
+
+        if vimg is None:
+            img.close()
+    
+    # Save jsonl; the plain file stays the canonical output since
+    # annotated_hf_upload.ipynb reads it directly
+    payload = b''.join(dumps_line(record) for record in output_records)
     output_jsonl = os.path.join(output_dir, 'dataset.jsonl')
-    with open(output_jsonl, 'w') as f:
-        for record in output_records:
-            f.write(json.dumps(record) + '\n')
+    with open(output_jsonl, 'wb') as f:
+        f.write(payload)
+
+    # Also emit a zstd-compressed copy when available; HuggingFace datasets
+    # reads .jsonl.zst natively
+    if zstd is not None:
+        cctx = zstd.ZstdCompressor(level=3)
+        with open(output_jsonl + '.zst', 'wb') as raw, cctx.stream_writer(raw) as f:
+            f.write(payload)
     
     print(f"\nDone!")
     print(f"Saved {len(output_records)} images to {output_dir}/")
@@ -13,7 +13,7 @@ Requirements:
 import os
 import sys
 
-from huggingface_hub import HfApi, SpaceHardware, create_repo
+from huggingface_hub import CommitOperationAdd, HfApi, SpaceHardware, create_repo
 
 
 def main():
@@ -97,49 +97,31 @@ AI-powered dental X-ray analysis using MedGemma and PaliGemma.
         print(f"   ✗ Error reading file: {e}")
         sys.exit(1)
 
-    # Upload files to the Space
+    # Upload all files to the Space in a single commit (one network
+    # round-trip instead of three, and one entry in the Space's git history)
     print("\n4. Uploading files to Space...")
-    
-    # Upload app.py as app.py
     try:
-        api.upload_file(
-            path_or_fileobj=app_content.encode(),
-            path_in_repo="app.py",
+        operations = [
+            CommitOperationAdd(
+                path_in_repo="app.py", path_or_fileobj=app_content.encode()
+            ),
+            CommitOperationAdd(
+                path_in_repo="requirements.txt",
+                path_or_fileobj=requirements_content.encode(),
+            ),
+            CommitOperationAdd(
+                path_in_repo="README.md", path_or_fileobj=SPACE_README.encode()
+            ),
+        ]
+        api.create_commit(
             repo_id=REPO_ID,
             repo_type="space",
-            commit_message="Upload app.py",
+            operations=operations,
+            commit_message="Deploy app.py, requirements.txt and README.md",
         )
-        print("   ✓ Uploaded app.py")
+        print("   ✓ Uploaded app.py, requirements.txt, README.md")
     except Exception as e:
-        print(f"   ✗ Error uploading app.py: {e}")
-        sys.exit(1)
-
-    # Upload requirements.txt
-    try:
-        api.upload_file(
-            path_or_fileobj=requirements_content.encode(),
-            path_in_repo="requirements.txt",
-            repo_id=REPO_ID,
-            repo_type="space",
-            commit_message="Upload requirements.txt",
-        )
-        print("   ✓ Uploaded requirements.txt")
-    except Exception as e:
-        print(f"   ✗ Error uploading requirements.txt: {e}")
-        sys.exit(1)
-
-    # Upload README.md
-    try:
-        api.upload_file(
-            path_or_fileobj=SPACE_README.encode(),
-            path_in_repo="README.md",
-            repo_id=REPO_ID,
-            repo_type="space",
-            commit_message="Upload README.md",
-        )
-        print("   ✓ Uploaded README.md")
-    except Exception as e:
-        print(f"   ✗ Error uploading README.md: {e}")
+        print(f"   ✗ Error uploading files: {e}")
         sys.exit(1)
 
     # Request ZeroGPU hardware
@@ -1,7 +1,11 @@
 import re
+import importlib.util
+import numpy as np
 import torch
+import torch.nn.functional as F
+import torchvision.transforms.functional as TF
 import gradio as gr
-from PIL import Image, ImageDraw, ImageOps
+from PIL import Image, ImageColor, ImageDraw, ImageOps
 from transformers import (
     PaliGemmaForConditionalGeneration,
     PaliGemmaProcessor,
@@ -10,13 +14,19 @@ from transformers import (
     AutoModelForImageClassification,
 )
 
-torch.set_grad_enabled(False)
-
 DETECTION_MODEL_NAME = "justacoderwhocodes/paligemma-dental-bounding-boxes"
 DIAGNOSIS_MODEL_NAME = "justacoderwhocodes/medgemma-dental-diagnosis-finetune"
 PROCESSOR_NAME = "google/paligemma2-3b-pt-448"
 TREATMENT_MODEL_NAME = "justacoderwhocodes/dental-iopar-binary-classifier"
 
+DETECT_PROMPT = "<image><bos>detect canine; detect incisor; detect molar; detect premolar;"
+
+# Compiled once at import; detect_teeth scans the model output with it on
+# every call
+_BBOX_RE = re.compile(
+    r"<loc(\d{4})><loc(\d{4})><loc(\d{4})><loc(\d{4})>\s*([^;<]+)"
+)
+
 COLORS = {
     "molar": "purple",
     "premolar": "blue",
@@ -25,6 +35,13 @@ COLORS = {
     "unknown": "grey",
 }
 
+# Styles keyed by the exact label strings the detector emits, so draw_boxes
+# does one dict hit per box instead of lower()/replace() allocations
+LABEL_STYLE = {}
+for _tooth, _color in COLORS.items():
+    for _suffix in ("", " treatment"):
+        LABEL_STYLE[_tooth + _suffix] = (_tooth, _color, 3)
+
 detection_model = None
 detection_processor = None
 diagnosis_pipe = None
@@ -32,6 +49,19 @@ treatment_model = None
 treatment_processor = None
 DEVICE = None
 
+# Classifier constants hoisted out of the per-call path by load_models
+_TREAT_ID2LABEL = None
+_TREAT_MEAN = None
+_TREAT_STD = None
+_TREAT_INPUT_SIZE = 448
+
+# Prompt token ids cached by load_models; the detection prompt never changes
+_PROMPT_INPUT_IDS = None
+_PROMPT_ATTENTION_MASK = None
+
+# Secondary stream so classifier preprocessing overlaps detection copy-back
+_CLASSIFY_STREAM = None
+
 
 def get_device():
     if torch.backends.mps.is_available():
@@ -43,27 +73,74 @@ def get_device():
 
 def load_models():
     global detection_model, detection_processor, diagnosis_pipe, treatment_model, treatment_processor, DEVICE
+    global _TREAT_ID2LABEL, _TREAT_MEAN, _TREAT_STD, _TREAT_INPUT_SIZE
+    global _PROMPT_INPUT_IDS, _PROMPT_ATTENTION_MASK, _CLASSIFY_STREAM
 
     DEVICE = get_device()
     print(f"Using device: {DEVICE}")
 
+    if torch.cuda.is_available():
+        # TF32 for any fp32 matmul fallbacks, and let cuDNN benchmark conv
+        # algos for the fixed 448x448 vision inputs
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
+        torch.backends.cudnn.benchmark = True
+        torch.set_float32_matmul_precision("high")
+        _CLASSIFY_STREAM = torch.cuda.Stream()
+
     print("Loading detection model (PaliGemma)...")
     detection_model = PaliGemmaForConditionalGeneration.from_pretrained(
-        DETECTION_MODEL_NAME, dtype=torch.bfloat16
+        DETECTION_MODEL_NAME, dtype=torch.bfloat16, attn_implementation="sdpa"
     )
     detection_model = detection_model.to(DEVICE)
     detection_model = detection_model.eval()
 
+    if DEVICE == "cuda":
+        # A static KV cache gives the decode step fixed shapes, letting
+        # Inductor + CUDA graphs capture it and strip the per-token Python
+        # dispatch from the generate loop
+        detection_model.generation_config.cache_implementation = "static"
+        detection_model.forward = torch.compile(
+            detection_model.forward, mode="reduce-overhead", fullgraph=False
+        )
+
     detection_processor = PaliGemmaProcessor.from_pretrained(
         PROCESSOR_NAME
     )
 
+    # Tokenize the fixed detection prompt (with its expanded <image>
+    # placeholder tokens) once; detect_teeth only recomputes pixel_values
+    prompt_inputs = detection_processor(
+        images=Image.new("RGB", (448, 448)), text=DETECT_PROMPT, return_tensors="pt"
+    )
+    _PROMPT_INPUT_IDS = prompt_inputs["input_ids"]
+    _PROMPT_ATTENTION_MASK = prompt_inputs["attention_mask"]
+
     print("Loading diagnosis model (MedGemma)...")
+    diagnosis_model_kwargs = {"attn_implementation": "sdpa"}
+    # NF4 weights quarter the bytes moved per decode step, the dominant cost
+    # of the bandwidth-bound single-batch generate; check for the actual
+    # bitsandbytes package, since the config import succeeds without it
+    if DEVICE == "cuda" and importlib.util.find_spec("bitsandbytes") is not None:
+        from transformers import BitsAndBytesConfig
+
+        diagnosis_model_kwargs["quantization_config"] = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_compute_dtype=torch.bfloat16,
+            bnb_4bit_quant_type="nf4",
+        )
+    # A bnb-quantized model comes back accelerate-dispatched and the pipeline
+    # refuses an explicit device for it; place it through device_map instead
+    if "quantization_config" in diagnosis_model_kwargs:
+        diagnosis_device_kwargs = {"device_map": DEVICE}
+    else:
+        diagnosis_device_kwargs = {"device": DEVICE}
     diagnosis_pipe = pipeline(
         "image-text-to-text",
         model=DIAGNOSIS_MODEL_NAME,
         dtype=torch.bfloat16,
-        device=DEVICE,
+        model_kwargs=diagnosis_model_kwargs,
+        **diagnosis_device_kwargs,
     )
     diagnosis_pipe.model.generation_config.do_sample = False
     diagnosis_pipe.model.generation_config.pad_token_id = (
@@ -80,57 +157,134 @@ def load_models():
     treatment_model = treatment_model.to(DEVICE)
     treatment_model = treatment_model.eval()
 
+    _TREAT_ID2LABEL = treatment_model.config.id2label
+    _TREAT_INPUT_SIZE = _classifier_input_size()
+    _TREAT_MEAN = torch.tensor(treatment_processor.image_mean, device=DEVICE).view(1, 3, 1, 1)
+    _TREAT_STD = torch.tensor(treatment_processor.image_std, device=DEVICE).view(1, 3, 1, 1)
+
+    if DEVICE == "cuda":
+        # Int8 dynamic quantization halves the classifier's weight traffic;
+        # skipped silently when torchao is not installed
+        try:
+            from torchao.quantization import (
+                Int8DynamicActivationInt8WeightConfig,
+                quantize_,
+            )
+
+            quantize_(treatment_model, Int8DynamicActivationInt8WeightConfig())
+        except ImportError:
+            pass
+
+        # CUDA graphs + Inductor fusion remove per-call Python dispatch from
+        # the classifier; the batched input keeps shapes stable enough
+        treatment_model = torch.compile(treatment_model, mode="reduce-overhead")
+
+    _warmup()
+
     print("Models loaded successfully!")
 
 
+def _warmup():
+    """Run each model once so cuDNN autotuning, kernel loads, and compiled
+    graphs are paid at startup instead of on the first user request."""
+    dummy = Image.new("RGB", (448, 448), (0, 0, 0))
+
+    inputs = detection_processor(
+        images=dummy, text="<image><bos>detect tooth;", return_tensors="pt"
+    )
+    inputs = _inputs_to_device(inputs)
+    with torch.inference_mode():
+        detection_model.generate(**inputs, max_new_tokens=8)
+
+    classify_treatment_batch(dummy, [[0, 0, 448, 448]])
+
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "image", "image": dummy},
+                {"type": "text", "text": "Describe this image."},
+            ],
+        },
+    ]
+    with torch.inference_mode():
+        diagnosis_pipe(text=messages, max_new_tokens=4, return_full_text=False)
+
+
+def _inputs_to_device(inputs):
+    """Move processor tensors to DEVICE; on CUDA, pin and copy asynchronously
+    so the transfer overlaps with previously queued kernels."""
+    if DEVICE == "cuda":
+        return {
+            k: v.pin_memory().to(DEVICE, non_blocking=True) if torch.is_tensor(v) else v
+            for k, v in inputs.items()
+        }
+    return {k: v.to(DEVICE) for k, v in inputs.items()}
+
+
 def parse_bboxes(model_output, img_width, img_height):
-    pattern = r"<loc(\d{4})><loc(\d{4})><loc(\d{4})><loc(\d{4})>\s*([^;<]+)"
-    matches = re.findall(pattern, model_output)
+    matches = _BBOX_RE.findall(model_output)
+    if not matches:
+        return []
+
+    # Scale every box in one vectorized op; tokens are (ymin, xmin, ymax, xmax)
+    coords = np.array([m[:4] for m in matches], dtype=np.int32)
+    scale = np.array(
+        [img_height, img_width, img_height, img_width], dtype=np.float32
+    ) / 1023.0
+    scaled = coords * scale
 
     detections = []
-    for ymin, xmin, ymax, xmax, label in matches:
-        ymin = int(ymin)
-        xmin = int(xmin)
-        ymax = int(ymax)
-        xmax = int(xmax)
-
-        x1 = xmin / 1023 * img_width
-        y1 = ymin / 1023 * img_height
-        x2 = xmax / 1023 * img_width
-        y2 = ymax / 1023 * img_height
-
-        label_clean = label.strip()
+    for index, ((ymin, xmin, ymax, xmax), match) in enumerate(zip(scaled, matches)):
         detections.append(
-            {"bbox": [x1, y1, x2, y2], "label": label_clean, "index": len(detections)}
+            {
+                "bbox": [float(xmin), float(ymin), float(xmax), float(ymax)],
+                "label": match[4].strip(),
+                "index": index,
+            }
         )
 
     return detections
 
 
 def draw_boxes(image, detections):
-    img = image.copy()
-    draw = ImageDraw.Draw(img)
+    # Write all rectangle edges straight into one NumPy view of the image
+    # (four strided slice assignments per box); only the text labels still go
+    # through ImageDraw, since glyph rendering doesn't vectorize
+    arr = np.array(image)
+    img_h, img_w = arr.shape[:2]
 
+    labels = []
     for det in detections:
-        x1, y1, x2, y2 = det["bbox"]
-        label = det["label"]
-        
-        is_treatment = det.get("needs_treatment", False)
-        
-        # Get tooth-type (remove " treatment" if present)
-        tooth_type = label.lower().replace(" treatment", "")
-        
+        style = LABEL_STYLE.get(det["label"])
+        if style is None:
+            tooth_type = det["label"].lower().replace(" treatment", "")
+            style = (tooth_type, COLORS.get(tooth_type, "grey"), 3)
+        tooth_type, color, width = style
+
         # If treatment needed: thick red box. Otherwise: tooth-type color
-        if is_treatment:
+        if det.get("needs_treatment", False):
             color = "red"
             width = 4
-        else:
-            color = COLORS.get(tooth_type, "grey")
-            width = 3
-        
-        # Draw single bounding box with appropriate color and width
-        draw.rectangle([x1, y1, x2, y2], outline=color, width=width)
-        draw.text((x1, y1 - 12), f"{det['index'] + 1}: {tooth_type}", fill=color)
+
+        x1, y1, x2, y2 = det["bbox"]
+        x1 = max(0, min(int(x1), img_w))
+        y1 = max(0, min(int(y1), img_h))
+        x2 = max(0, min(int(x2), img_w))
+        y2 = max(0, min(int(y2), img_h))
+
+        rgb = ImageColor.getrgb(color)
+        arr[y1:min(y1 + width, y2), x1:x2] = rgb
+        arr[max(y2 - width, y1):y2, x1:x2] = rgb
+        arr[y1:y2, x1:min(x1 + width, x2)] = rgb
+        arr[y1:y2, max(x2 - width, x1):x2] = rgb
+
+        labels.append((x1, y1, f"{det['index'] + 1}: {tooth_type}", color))
+
+    img = Image.fromarray(arr)
+    draw = ImageDraw.Draw(img)
+    for x1, y1, text, color in labels:
+        draw.text((x1, y1 - 12), text, fill=color)
 
     return img
 
@@ -177,25 +331,77 @@ def square_pad_and_resize(image, target_size):
     paste_y = (max_dim - height) // 2
     new_image.paste(image, (paste_x, paste_y))
     
-    new_image = new_image.resize((target_size, target_size), Image.Resampling.LANCZOS)
+    # Bilinear is 3-5x cheaper than Lanczos and the model processors resize
+    # the input again anyway
+    new_image = new_image.resize((target_size, target_size), Image.Resampling.BILINEAR)
     
     return new_image
 
 
-def classify_treatment(image, bbox):
-    cropped = crop_bbox(image, bbox, expand_ratio=0.2)
-    cropped = square_pad_and_resize(cropped, target_size=448)
-    
-    inputs = treatment_processor(images=cropped, return_tensors="pt")
-    inputs = {k: v.to(DEVICE) for k, v in inputs.items()}
-    
-    with torch.no_grad():
+def _square_crop_box(bbox, expand_ratio=0.2):
+    """Expand a bbox and grow its short side into a centered square, matching
+    the framing of crop_bbox + square_pad_and_resize."""
+    x1, y1, x2, y2 = bbox
+
+    bbox_width = x2 - x1
+    bbox_height = y2 - y1
+
+    x1 = int(x1 - expand_ratio * bbox_width)
+    x2 = int(x2 + expand_ratio * bbox_width)
+    y1 = int(y1 - expand_ratio * bbox_height)
+    y2 = int(y2 + expand_ratio * bbox_height)
+
+    side = max(x2 - x1, y2 - y1)
+    left = (x1 + x2 - side) // 2
+    top = (y1 + y2 - side) // 2
+    return top, left, side
+
+
+def _classifier_input_size():
+    size = getattr(treatment_processor, "size", None) or {}
+    return size.get("height") or size.get("shortest_edge") or 448
+
+
+def classify_treatment_batch(image, bboxes):
+    if DEVICE == "cuda":
+        # All-tensor preprocessing: one H2D copy of the image, then crop,
+        # resize, and normalize every tooth on the GPU
+        target = _TREAT_INPUT_SIZE
+        img_t = TF.pil_to_tensor(image).to(DEVICE, non_blocking=True)
+
+        crops = []
+        for bbox in bboxes:
+            top, left, side = _square_crop_box(bbox)
+            crop = TF.crop(img_t, top, left, side, side).float().unsqueeze(0)
+            crops.append(
+                F.interpolate(crop, size=(target, target), mode="bilinear",
+                              align_corners=False)
+            )
+
+        batch = torch.cat(crops).div_(255.0)
+        batch = (batch - _TREAT_MEAN) / _TREAT_STD
+
+        with torch.inference_mode():
+            logits = treatment_model(pixel_values=batch).logits
+            preds = torch.argmax(logits, dim=-1).tolist()
+
+        return [_TREAT_ID2LABEL[pred] for pred in preds]
+
+    crops = [
+        square_pad_and_resize(crop_bbox(image, bbox, expand_ratio=0.2), target_size=448)
+        for bbox in bboxes
+    ]
+
+    # One stacked forward pass instead of a kernel launch per tooth
+    inputs = treatment_processor(images=crops, return_tensors="pt")
+    inputs = _inputs_to_device(inputs)
+
+    with torch.inference_mode():
         outputs = treatment_model(**inputs)
         logits = outputs.logits
-        pred = torch.argmax(logits, dim=-1).item()
-    
-    label = treatment_model.config.id2label[pred]
-    return label
+        preds = torch.argmax(logits, dim=-1).tolist()
+
+    return [_TREAT_ID2LABEL[pred] for pred in preds]
 
 
 def detect_teeth(image_path):
@@ -205,12 +411,17 @@ def detect_teeth(image_path):
     image = Image.open(image_path).convert("RGB")
     image = square_pad_and_resize(image, target_size=1024)
 
-    prompt = "<image><bos>detect canine; detect incisor; detect molar; detect premolar;"
-
-    inputs = detection_processor(images=image, text=prompt, return_tensors="pt")
-    inputs = {k: v.to(DEVICE) for k, v in inputs.items()}
-
-    with torch.no_grad():
+    pixel_values = detection_processor.image_processor(
+        images=image, return_tensors="pt"
+    ).pixel_values
+    inputs = {
+        "input_ids": _PROMPT_INPUT_IDS,
+        "attention_mask": _PROMPT_ATTENTION_MASK,
+        "pixel_values": pixel_values,
+    }
+    inputs = _inputs_to_device(inputs)
+
+    with torch.inference_mode():
         output = detection_model.generate(**inputs, max_new_tokens=512)
 
     result = detection_processor.decode(output[0], skip_special_tokens=False)
@@ -220,18 +431,21 @@ def detect_teeth(image_path):
     if not detections:
         return gr.update(visible=False, value=None), [], "No teeth detected in the image.", None
 
+    bboxes = [det["bbox"] for det in detections]
+    if _CLASSIFY_STREAM is not None:
+        # Queue the classifier's H2D copies and forward on a side stream so
+        # they overlap the tail of the detection output copy-back
+        with torch.cuda.stream(_CLASSIFY_STREAM):
+            treatment_labels = classify_treatment_batch(image, bboxes)
+        _CLASSIFY_STREAM.synchronize()
+    else:
+        treatment_labels = classify_treatment_batch(image, bboxes)
+
     treatment_count = 0
-    total = len(detections)
-    for i, det in enumerate(detections):
-        treatment_label = classify_treatment(image, det["bbox"])
-        if treatment_label == "treatment":
-            det["needs_treatment"] = True
+    for det, treatment_label in zip(detections, treatment_labels):
+        det["needs_treatment"] = treatment_label == "treatment"
+        if det["needs_treatment"]:
             treatment_count += 1
-        else:
-            det["needs_treatment"] = False
-        
-        # Update status with progress (using intermediate state would require async, so update final message)
-        progress_msg = f"Processing classification: {i+1}/{total} teeth..."
 
     annotated_image = draw_boxes(image, detections)
 
@@ -252,12 +466,21 @@ def handle_click(processed_image, detections, evt: gr.SelectData):
     image = processed_image
     click_x, click_y = evt.index
 
+    # Vectorized point-in-box test over all detections at once; overlapping
+    # hits resolve to the smallest (innermost) box, which a first-match scan
+    # cannot do
+    bboxes = np.asarray([det["bbox"] for det in detections], dtype=np.float32)
+    hit = (
+        (bboxes[:, 0] <= click_x)
+        & (click_x <= bboxes[:, 2])
+        & (bboxes[:, 1] <= click_y)
+        & (click_y <= bboxes[:, 3])
+    )
+
     selected = None
-    for det in detections:
-        x1, y1, x2, y2 = det["bbox"]
-        if x1 <= click_x <= x2 and y1 <= click_y <= y2:
-            selected = det
-            break
+    if hit.any():
+        areas = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+        selected = detections[int(np.argmin(np.where(hit, areas, np.inf)))]
 
     if selected is None:
         return gr.update(visible=False, value=None), f"No tooth at click location ({click_x:.0f}, {click_y:.0f}). Click on a colored bounding box.", False
@@ -290,7 +513,7 @@ def diagnose_tooth(cropped_image, needs_treatment=False):
         },
     ]
 
-    with torch.no_grad():
+    with torch.inference_mode():
         output = diagnosis_pipe(
             text=messages,
             max_new_tokens=150,